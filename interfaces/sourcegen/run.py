@@ -4,4 +4,7 @@
 import sys
 import sourcegen
 
-sourcegen.generate_source(*sys.argv[1:])
+# The guard matters on platforms where multiprocessing spawns fresh
+# interpreters (Windows, macOS): worker processes re-import this script.
+if __name__ == "__main__":
+    sourcegen.generate_source(*sys.argv[1:])
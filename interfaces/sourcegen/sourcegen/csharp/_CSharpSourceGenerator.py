@@ -1,109 +1,175 @@
 # This file is part of Cantera. See License.txt in the top-level directory or
 # at https://cantera.org/license.txt for license and copyright information.
 
-from itertools import starmap
+from concurrent.futures import ProcessPoolExecutor
+import functools
 from pathlib import Path
 import re
+import string
+import textwrap
 
 from ._dataclasses import CsFunc
 from ._Config import Config
-from .._helpers import normalize_indent
 from .._dataclasses import Func, Param, HeaderFile
 from .._SourceGenerator import SourceGenerator
 
 
+_THERMO_PAIR_SETTER_RE = re.compile(r"^set_[A-Z]{2}$")
+
+
+# The templates for the generated files are compiled once at import time.
+# The scaffold methods substitute pre-indented fragments into them in a
+# single pass instead of re-parsing an f-string and re-normalizing the
+# result for every file.
+_INTEROP_FILE_TPL = string.Template(textwrap.dedent("""\
+    $preamble
+
+    using System.Runtime.InteropServices;
+
+    namespace Cantera.Interop;
+
+    static partial class LibCantera
+    {
+    $functions
+    }"""))
+
+_HANDLES_FILE_TPL = string.Template(textwrap.dedent("""\
+    $preamble
+
+    namespace Cantera.Interop;
+
+    $handles"""))
+
+_WRAPPER_CLASS_FILE_TPL = string.Template(textwrap.dedent("""\
+    $preamble
+
+    using Cantera.Interop;
+
+    namespace Cantera;
+
+    public partial class $wrapper_class_name : IDisposable
+    {
+        readonly $handle_class_name _handle;
+
+        #pragma warning disable CS1591
+
+    $properties
+
+        #pragma warning restore CS1591
+
+        /// <summary>
+        /// Frees the underlying resources used by the
+        /// native Cantera library for this instance.
+        /// </summary>
+        public void Dispose() =>
+            _handle.Dispose();
+    }"""))
+
+
+# The same handle class can be requested repeatedly across header files,
+# so memoize the rendered text rather than re-formatting it each time.
+@functools.cache
+def _get_base_handle_text(class_name: str, release_func_name: str) -> str:
+    # No caller interpolates this into a larger f-string anymore, so plain
+    # dedent is enough; normalize_indent would scan the call stack for an
+    # interpolation context that can no longer occur.
+    handle = textwrap.dedent(f"""
+        class {class_name} : CanteraHandle
+        {{
+            protected override bool ReleaseHandle() =>
+                LibCantera.{release_func_name}(Value) == InteropConsts.Success;
+        }}
+    """).strip()
+
+    return handle
+
+
+@functools.cache
+def _get_derived_handle_text(derived_class_name: str, base_class_name: str) -> str:
+    derived_text = f"""class {derived_class_name} : {base_class_name} {{ }}"""
+
+    return derived_text
+
+
 class CSharpSourceGenerator(SourceGenerator):
     """The SourceGenerator for scaffolding C# files for the .NET interface"""
 
     @staticmethod
     def _join_params(params: list[Param]) -> str:
-        return ", ".join(p.p_type + " " + p.name for p in params)
+        return ", ".join([f"{p.p_type} {p.name}" for p in params])
 
     def _get_interop_func_text(self, func: CsFunc) -> str:
-        ret_type, name, params, _, _ = func
-        requires_unsafe_keyword = any(p.p_type.endswith("*") for p in params)
-        params_text = self._join_params(params)
+        ret_type = func.ret_type
+        name = func.name
+        params_text = self._join_params(func.params)
 
-        if requires_unsafe_keyword:
+        if func.requires_unsafe_keyword:
             return f"{self._config.func_prolog} unsafe {ret_type} {name}({params_text});"
         else:
             return f"{self._config.func_prolog} {ret_type} {name}({params_text});"
 
-    @staticmethod
-    def _get_base_handle_text(class_name: str, release_func_name: str) -> str:
-        handle = normalize_indent(f"""
-            class {class_name} : CanteraHandle
-            {{
-                protected override bool ReleaseHandle() =>
-                    LibCantera.{release_func_name}(Value) == InteropConsts.Success;
-            }}
-        """)
-
-        return handle
-
-    @staticmethod
-    def _get_derived_handle_text(derived_class_name: str, base_class_name: str) -> str:
-        derived_text = f"""class {derived_class_name} : {base_class_name} {{ }}"""
-
-        return derived_text
-
-
     def _get_property_text(self, clib_area: str, c_name: str, cs_name: str,
                            known_funcs: dict[str, CsFunc]) -> str:
-        getter = known_funcs.get(clib_area + "_" + c_name)
+        # both the getter fallback and the setter lookup use the
+        # capitalized name, so only build it once
+        capitalized_name = c_name.capitalize()
+
+        getter = known_funcs.get(f"{clib_area}_{c_name}")
 
         if getter:
             # here we have found a simple scalar property
             prop_type = getter.ret_type
         else:
             # here we have found an array-like property (string, double[])
-            getter = known_funcs[clib_area + "_get" + c_name.capitalize()]
+            getter = known_funcs[f"{clib_area}_get{capitalized_name}"]
             # this assumes the last param in the function is a pointer type,
             # from which we determine the appropriate C# type
             prop_type = self._config.prop_type_crosswalk[getter.params[-1].p_type]
 
-        setter = known_funcs.get(clib_area + "_set" + c_name.capitalize())
+        setter = known_funcs.get(f"{clib_area}_set{capitalized_name}")
 
+        # Gather the fragments in a list and join them once at the end
+        # rather than growing a string with += in each branch.
         if prop_type in ["int", "double"]:
-            text = f"""
+            fragments = [f"""
                 public {prop_type} {cs_name}
                 {{
                     get => InteropUtil.CheckReturn(
-                        LibCantera.{getter.name}(_handle));"""
+                        LibCantera.{getter.name}(_handle));"""]
 
             if setter:
-                text += f"""
+                fragments.append(f"""
                     set => InteropUtil.CheckReturn(
-                        LibCantera.{setter.name}(_handle, value));"""
+                        LibCantera.{setter.name}(_handle, value));""")
 
-            text += """
+            fragments.append("""
                 }
-            """
+            """)
         elif prop_type == "string":
             p_type = getter.params[1].p_type
 
             # for get-string type functions we need to look up the type of the second
             # (index 1) param for a cast because sometimes it"s an int and other times
             # its a nuint (size_t)
-            text = f"""
+            fragments = [f"""
                 public unsafe string {cs_name}
                 {{
                     get => InteropUtil.GetString(40, (length, buffer) =>
                         LibCantera.{getter.name}(_handle, ({p_type}) length, buffer));
-            """
+            """]
 
             if setter:
-                text += f"""
+                fragments.append(f"""
                     set => InteropUtil.CheckReturn(
-                        LibCantera.{setter.name}(_handle, value));"""
+                        LibCantera.{setter.name}(_handle, value));""")
 
-            text += """
+            fragments.append("""
                 }
-            """
+            """)
         else:
             raise ValueError(f"Unable to scaffold properties of type {prop_type}!")
 
-        return normalize_indent(text)
+        return textwrap.dedent("".join(fragments)).strip()
 
     def __init__(self, out_dir: Path, config: dict):
         self._out_dir = out_dir
@@ -111,23 +177,40 @@ class CSharpSourceGenerator(SourceGenerator):
         # use the typed config
         self._config = Config.from_parsed(config)
 
+        # The preamble is the same for every generated file and the templates
+        # place it at the outermost level, so dedent it once here.
+        self._preamble = textwrap.dedent(self._config.preamble).strip()
+
+        # Map each CLib area straight to its handle class name so that
+        # _convert_func doesn't re-append the "Handle" suffix for every func.
+        self._handle_class_names = {clib_area: class_name + "Handle"
+            for (clib_area, class_name) in self._config.class_crosswalk.items()}
+
     def _get_wrapper_class_name(self, clib_area: str) -> str:
         return self._config.class_crosswalk[clib_area]
 
     def _get_handle_class_name(self, clib_area: str) -> str:
-        return self._get_wrapper_class_name(clib_area) + "Handle"
+        return self._handle_class_names[clib_area]
 
     def _convert_func(self, parsed: Func) -> CsFunc:
-        ret_type, name, _ = parsed
+        ret_type = parsed.ret_type
+        name = parsed.name
         clib_area, method = name.split("_", 1)
 
-        # Shallow copy the params list
+        # The branches below only ever look at the first three characters of
+        # the method name, so slice them out once instead of calling
+        # startswith for each candidate prefix.
+        method_prefix = method[:3]
+
+        # Bind the crosswalk to a local: this function runs for every CLib func
+        # and the loops below would otherwise repeat the attribute lookups.
+        ret_type_crosswalk = self._config.ret_type_crosswalk
+
         # Some of the C# params will have the same syntax as the C params.
-        # Others will be represented differently on the C# side, and we will
-        # replace their entry in the list.
-        # Therefore, copy the list so that we don’t accidentally modify
+        # Others will be represented differently on the C# side.
+        # Therefore, build a new list below rather than modifying
         # the params list which is attached to the C func.
-        params = parsed.params[:]
+        params = parsed.params
 
         release_func_handle_class_name = None
 
@@ -137,31 +220,30 @@ class CSharpSourceGenerator(SourceGenerator):
             # It’s not a “global” function, therefore:
             #   * It wraps a constructor and returns a handle, or
             #   * It wraps an instance method and takes the handle as the first param.
-            if method.startswith("del"):
+            if method_prefix == "del":
                 release_func_handle_class_name = handle_class_name
-            elif method.startswith("new"):
+            elif method_prefix == "new":
                 ret_type = handle_class_name
             else:
-                params[0] = Param(handle_class_name, params[0].name)
+                params = [Param(handle_class_name, params[0].name), *params[1:]]
 
-        for c_type, cs_type in self._config.ret_type_crosswalk.items():
-            if ret_type == c_type:
-                ret_type = cs_type
-                break
+        ret_type = ret_type_crosswalk.get(ret_type, ret_type)
 
         setter_double_arrays_count = 0
 
-        for i in range(0, len(params)):
-            param_type, param_name = params[i]
+        # The loop below already inspects every converted param type, so
+        # determine here whether the interop method needs the unsafe keyword
+        # rather than rescanning the params when scaffolding it.
+        requires_unsafe_keyword = False
+
+        cs_params = []
 
-            for c_type, cs_type in self._config.ret_type_crosswalk.items():
-                if param_type == c_type:
-                    param_type = cs_type
-                    break
+        for param in params:
+            param_type = ret_type_crosswalk.get(param.p_type, param.p_type)
 
             # Most "setter" functions for arrays in CLib use a const double*,
             # but we also need to handle the cases for a plain double*
-            if param_type == "double*" and method.startswith("set"):
+            if param_type == "double*" and method_prefix == "set":
                 setter_double_arrays_count += 1
                 if setter_double_arrays_count > 1:
                     # We assume a double* can reliably become a double[].
@@ -170,7 +252,7 @@ class CSharpSourceGenerator(SourceGenerator):
                     raise ValueError(f"Cannot scaffold {name} with "
                         + "more than one array of doubles!")
 
-                if clib_area == "thermo" and re.match("^set_[A-Z]{2}$", method):
+                if clib_area == "thermo" and _THERMO_PAIR_SETTER_RE.match(method):
                     # Special case for the functions that set thermo pairs
                     # This allows the C# side to pass a pointer to the stack
                     # Rather than allocating an array on the heap (which requires GC)
@@ -178,125 +260,121 @@ class CSharpSourceGenerator(SourceGenerator):
                 else:
                     param_type = "double[]"
 
-            params[i] = Param(param_type, param_name)
+            if param_type.endswith("*"):
+                requires_unsafe_keyword = True
+
+            cs_params.append(Param(param_type, param.name))
 
         func = CsFunc(ret_type,
                       name,
-                      params,
+                      cs_params,
                       release_func_handle_class_name is not None,
-                      release_func_handle_class_name)
+                      release_func_handle_class_name,
+                      requires_unsafe_keyword)
 
         return func
 
     def _write_file(self, filename: str, contents: str):
-        print("  writing " + filename)
+        print(f"  writing {filename}")
 
         self._out_dir.joinpath(filename).write_text(contents)
 
-    def _scaffold_interop(self, header_file_path: Path, cs_funcs: list[CsFunc]):
-        functions_text = "\n\n".join(map(self._get_interop_func_text, cs_funcs))
-
-        interop_text = normalize_indent(f"""
-            {normalize_indent(self._config.preamble)}
-
-            using System.Runtime.InteropServices;
-
-            namespace Cantera.Interop;
-
-            static partial class LibCantera
-            {{
-                {normalize_indent(functions_text)}
-            }}
-        """)
-
-        self._write_file("Interop.LibCantera." + header_file_path.name + ".g.cs",
-            interop_text)
+    def _scaffold_interop(self, header_file_path: Path,
+                          cs_funcs: list[CsFunc]) -> tuple[str, str]:
+        functions_text = "\n\n".join(
+            [self._get_interop_func_text(func) for func in cs_funcs])
 
-    def _scaffold_handles(self, header_file_path: Path, handles: dict[str, str]):
-        handles_text = "\n\n".join(starmap(self._get_base_handle_text, handles.items()))
+        interop_text = _INTEROP_FILE_TPL.substitute(
+            preamble=self._preamble,
+            functions=textwrap.indent(functions_text, " " * 4))
 
-        handles_text = normalize_indent(f"""
-            {normalize_indent(self._config.preamble)}
+        return (f"Interop.LibCantera.{header_file_path.name}.g.cs", interop_text)
 
-            namespace Cantera.Interop;
+    def _scaffold_handles(self, header_file_path: Path,
+                          handles: dict[str, str]) -> tuple[str, str]:
+        handles_text = "\n\n".join(
+            [_get_base_handle_text(class_name, release_func_name)
+                for (class_name, release_func_name) in handles.items()])
 
-            {normalize_indent(handles_text)}
-        """)
+        handles_text = _HANDLES_FILE_TPL.substitute(
+            preamble=self._preamble, handles=handles_text)
 
-        self._write_file("Interop.Handles." + header_file_path.name + ".g.cs",
-            handles_text)
+        return (f"Interop.Handles.{header_file_path.name}.g.cs", handles_text)
 
-    def _scaffold_derived_handles(self):
-        derived_handles = "\n\n".join(starmap(self._get_derived_handle_text,
-            self._config.derived_handles.items()))
+    def _scaffold_derived_handles(self) -> tuple[str, str]:
+        derived_handles = "\n\n".join(
+            [_get_derived_handle_text(derived_class_name, base_class_name)
+                for (derived_class_name, base_class_name)
+                in self._config.derived_handles.items()])
 
-        derived_handles_text = normalize_indent(f"""
-            {normalize_indent(self._config.preamble)}
+        derived_handles_text = _HANDLES_FILE_TPL.substitute(
+            preamble=self._preamble, handles=derived_handles)
 
-            namespace Cantera.Interop;
-
-            {derived_handles}
-        """)
-
-        self._write_file("Interop.Handles.g.cs", derived_handles_text)
+        return ("Interop.Handles.g.cs", derived_handles_text)
 
     def _scaffold_wrapper_class(self, clib_area: str, props: dict[str, str],
-                                known_funcs: dict[str, CsFunc]):
+                                known_funcs: dict[str, CsFunc]) -> tuple[str, str]:
         wrapper_class_name = self._get_wrapper_class_name(clib_area)
         handle_class_name = self._get_handle_class_name(clib_area)
 
         properties_text = "\n\n".join(
-            self._get_property_text(clib_area, c_name, cs_name, known_funcs)
-                for (c_name, cs_name) in props.items())
+            [self._get_property_text(clib_area, c_name, cs_name, known_funcs)
+                for (c_name, cs_name) in props.items()])
 
-        wrapper_class_text = normalize_indent(f"""
-            {normalize_indent(self._config.preamble)}
+        wrapper_class_text = _WRAPPER_CLASS_FILE_TPL.substitute(
+            preamble=self._preamble,
+            wrapper_class_name=wrapper_class_name,
+            handle_class_name=handle_class_name,
+            properties=textwrap.indent(properties_text, " " * 4))
 
-            using Cantera.Interop;
+        return (f"{wrapper_class_name}.g.cs", wrapper_class_text)
 
-            namespace Cantera;
+    def _scaffold_header_file(self,
+            header_file: HeaderFile) -> tuple[list[tuple[str, str]], list[CsFunc]]:
+        cs_funcs = []
 
-            public partial class {wrapper_class_name} : IDisposable
-            {{
-                readonly {handle_class_name} _handle;
+        # Collect the handles while converting instead of re-scanning cs_funcs
+        # afterwards; keying on the class name also dedupes, should several
+        # funcs ever release the same handle.
+        handles: dict[str, str] = {}
 
-                #pragma warning disable CS1591
+        for func in header_file.funcs:
+            cs_func = self._convert_func(func)
+            cs_funcs.append(cs_func)
 
-                {normalize_indent(properties_text)}
+            if cs_func.is_handle_release_func:
+                handles[cs_func.handle_class_name] = cs_func.name
 
-                #pragma warning restore CS1591
+        generated = [self._scaffold_interop(header_file.path, cs_funcs)]
 
-                /// <summary>
-                /// Frees the underlying resources used by the
-                /// native Cantera library for this instance.
-                /// </summary>
-                public void Dispose() =>
-                    _handle.Dispose();
-            }}
-        """)
+        if handles:
+            generated.append(self._scaffold_handles(header_file.path, handles))
 
-        self._write_file(wrapper_class_name + ".g.cs", wrapper_class_text)
+        return (generated, cs_funcs)
 
     def generate_source(self, headers_files: list[HeaderFile]):
         self._out_dir.mkdir(parents=True, exist_ok=True)
 
-        known_funcs: dict[str, list[CsFunc]] = {}
-
-        for header_file in headers_files:
-            cs_funcs = list(map(self._convert_func, header_file.funcs))
-            known_funcs.update((f.name, f) for f in cs_funcs)
+        known_funcs: dict[str, CsFunc] = {}
 
-            self._scaffold_interop(header_file.path, cs_funcs)
+        # Scaffold everything up front and issue the writes in a single pass
+        # at the end, rather than interleaving generation with file IO.
+        generated: list[tuple[str, str]] = []
 
-            handles = {func.handle_class_name: func.name
-                for func in cs_funcs if func.is_handle_release_func}
+        # Each header file scaffolds independently of the others; only the
+        # wrapper classes below need the merged known_funcs. Farm the
+        # per-header work out to worker processes and merge the results here.
+        with ProcessPoolExecutor() as executor:
+            for (header_generated, cs_funcs) \
+                    in executor.map(self._scaffold_header_file, headers_files):
+                generated.extend(header_generated)
+                known_funcs.update((f.name, f) for f in cs_funcs)
 
-            if not handles:
-                continue
-
-            self._scaffold_handles(header_file.path, handles)
-
-        self._scaffold_derived_handles()
+        generated.append(self._scaffold_derived_handles())
 
         for (clib_area, props) in self._config.wrapper_classes.items():
-            self._scaffold_wrapper_class(clib_area, props, known_funcs)
+            generated.append(self._scaffold_wrapper_class(clib_area, props,
+                known_funcs))
+
+        for (filename, contents) in generated:
+            self._write_file(filename, contents)
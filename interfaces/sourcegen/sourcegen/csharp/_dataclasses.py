@@ -14,3 +14,4 @@ class CsFunc(Func):
 
     is_handle_release_func: bool
     handle_class_name: str | None
+    requires_unsafe_keyword: bool